@@ -1,11 +1,17 @@
+import copy
+from dataclasses import make_dataclass
+from operator import attrgetter
+
 import streamlit as st
 import plotly.graph_objects as go
+import plotly.io as pio
+import numpy as np
 
 # Page Config
 st.set_page_config(page_title="☕ My Café", layout="wide")
 
 # CSS for Styling with Watermark
-st.markdown("""
+CSS = """
     <style>
         * {
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
@@ -79,80 +85,77 @@ st.markdown("""
     </style>
     <div class="watermark">Powered by BITSoM AI Center</div>
     <div class="footer-watermark">© 2025 BITSoM AI Center. All rights reserved.</div>
-""", unsafe_allow_html=True)
+"""
+
+def _inject_css():
+    """Emit the page styles on full runs; _dashboard fragment reruns leave them in place"""
+    st.markdown(CSS, unsafe_allow_html=True)
+
+_inject_css()
 
 # Cafe Parameters
-items = {
-    "Latte": {"price": 100, "variable_cost": 50, "color": "#8B4513"},  # Set default price
-    "Americano": {"price": 90, "variable_cost": 40, "color": "#654321"},
-    "Cappuccino": {"price": 120, "variable_cost": 60, "color": "#D2691E"}
-}
+@st.cache_resource
+def get_items():
+    """Shared, read-only product config; per-session prices live in session state"""
+    return {
+        "Latte": {"price": 100, "variable_cost": 50, "color": "#8B4513"},  # Set default price
+        "Americano": {"price": 90, "variable_cost": 40, "color": "#654321"},
+        "Cappuccino": {"price": 120, "variable_cost": 60, "color": "#D2691E"}
+    }
+
+items = get_items()
 fixed_costs = 10000  # Rent, salaries, etc.
+ORDER = tuple(items)
+COLORS = tuple(items[i]["color"] for i in ORDER)
+VARIABLE_COSTS = tuple(items[i]["variable_cost"] for i in ORDER)
+VCOSTS = np.array(VARIABLE_COSTS, dtype=np.int64)
+X_TOTAL = ['Total Contribution'] * len(ORDER)
+X_FIXED = ['Fixed Costs']
+SALES_FIELDS = tuple(i.lower() for i in ORDER)
+fmt = "₹{:,}".format  # Currency formatter, e.g. fmt(10000) -> '₹10,000'
 
 # Session State Initialization
-if "state" not in st.session_state:
-    st.session_state.state = {"Latte": 0, "Americano": 0, "Cappuccino": 0}
+# Units sold per product, one slotted int field per item (latte, americano, ...)
+Sales = make_dataclass("Sales", [(f, int, 0) for f in SALES_FIELDS], slots=True)
+sales_quantities = attrgetter(*SALES_FIELDS)  # Sales -> quantities tuple in ORDER
+
+st.session_state.setdefault("sales", Sales())
+st.session_state.setdefault("prices", {item: items[item]["price"] for item in items})
 
 # Helper Functions
 def update_sales(item):
     quantity = st.session_state[f"quantity_{item}"]
-    st.session_state.state[item] = max(0, quantity)  # Ensure quantity is non-negative
+    setattr(st.session_state.sales, item.lower(), max(0, quantity))  # Ensure quantity is non-negative
 
-def create_breakeven_chart():
-    """Create simple breakeven bar chart"""
-    state = st.session_state.state
-    
-    # Calculate contribution for each product
-    contributions = {}
-    for item in items:
-        contribution_per_unit = items[item]["price"] - items[item]["variable_cost"]
-        contributions[item] = state[item] * contribution_per_unit
-    
-    total_contribution = sum(contributions.values())
-    
-    # Create the chart
+def update_price(item):
+    st.session_state.prices[item] = st.session_state[f"{item}_price"]
+
+@st.cache_resource
+def _template_dict(fixed_costs):
+    """Build and validate the static traces and layout once, kept as a plain dict"""
     fig = go.Figure()
     
-    # Add stacked bars for contributions from each product
-    bottom = 0
-    for item, contribution in contributions.items():
-        # Show all items, even with zero contribution, for visibility
-        fig.add_trace(go.Bar(
-            x=['Total Contribution'],
-            y=[max(0, contribution)],  # Use max to avoid negative bars
-            name=f'{item} Contribution',
-            marker_color=items[item]["color"],
-            base=bottom,
-            text=f'₹{contribution:,}' if contribution != 0 else '₹0',
-            textposition='inside' if contribution > 10000 else 'outside',
-            textfont=dict(color='white' if contribution > 10000 else 'black')
-        ))
-        if contribution > 0:
-            bottom += contribution
+    # Add one stacked bar trace with a segment per product
+    fig.add_trace(go.Bar(
+        x=X_TOTAL,
+        y=[0] * len(ORDER),
+        name='Contribution',
+        marker_color=list(COLORS),
+        hovertext=list(ORDER),
+        showlegend=False  # One trace, many colours; segment labels name the products
+    ))
     
     # Add fixed costs bar
     fig.add_trace(go.Bar(
-        x=['Fixed Costs'],
+        x=X_FIXED,
         y=[fixed_costs],
         name='Fixed Costs',
         marker_color='#ff4444',
-        text=f'₹{fixed_costs:,}',
+        text=fmt(fixed_costs),
         textposition='inside',
         textfont=dict(color='white')
     ))
     
-    # Add breakeven line
-    if total_contribution > 0:
-        max_height = max(total_contribution, fixed_costs)
-        fig.add_hline(
-            y=fixed_costs, 
-            line_dash="dash", 
-            line_color="red", 
-            line_width=3,
-            annotation_text="Breakeven Line",
-            annotation_position="top right"
-        )
-    
     # Update layout
     fig.update_layout(
         title={
@@ -167,6 +170,7 @@ def create_breakeven_chart():
         plot_bgcolor='rgba(0,0,0,0)',
         paper_bgcolor='rgba(0,0,0,0)',
         font=dict(size=14),
+        barmode='stack',
         showlegend=True,
         legend=dict(
             orientation="h",
@@ -177,13 +181,64 @@ def create_breakeven_chart():
         )
     )
     
+    return fig.to_dict()
+
+def _template_fig(fixed_costs):
+    """Fresh figure from the cached template, skipping validation of the already-valid spec"""
+    # Deep copy so patching never touches the dict shared across sessions
+    return go.Figure(copy.deepcopy(_template_dict(fixed_costs)), _validate=False)
+
+@st.cache_resource
+def _empty_fig(fixed_costs):
+    """Chart shown before anything is sold; built once and never patched"""
+    fig = _template_fig(fixed_costs)
+    fig.add_annotation(
+        x=0,
+        y=fixed_costs / 2,
+        text="Set prices and quantities<br>to see your breakeven",
+        showarrow=False,
+        bgcolor="lightyellow",
+        bordercolor="orange"
+    )
+    return fig
+
+@st.cache_data(max_entries=128)
+def _chart_json(qtys, prices, variable_costs, fixed_costs):
+    """Build the breakeven bar chart from hashable per-item tuples, cached as JSON"""
+    # Calculate contribution for each product
+    contributions = [qty * (price - vcost) for qty, price, vcost in zip(qtys, prices, variable_costs)]
+    
+    total_contribution = sum(contributions)
+    
+    fig = _template_fig(fixed_costs)
+    
+    # Patch the stacked contribution segments; zero segments get no label so they don't overlap
+    fig.update_traces(
+        selector=dict(name='Contribution'),
+        y=[max(0, c) for c in contributions],  # Use max to avoid negative bars
+        text=['' if c == 0 else f"{name}: {fmt(c)}" for name, c in zip(ORDER, contributions)],
+        textposition=['inside' if c > 10000 else 'outside' for c in contributions],
+        textfont=dict(color=['white' if c > 10000 else 'black' for c in contributions])
+    )
+    
+    # Add breakeven line
+    if total_contribution > 0:
+        fig.add_hline(
+            y=fixed_costs, 
+            line_dash="dash", 
+            line_color="red", 
+            line_width=3,
+            annotation_text="Breakeven Line",
+            annotation_position="top right"
+        )
+    
     # Add annotations for better understanding
     if total_contribution >= fixed_costs:
         profit = total_contribution - fixed_costs
         fig.add_annotation(
             x=0,
             y=total_contribution + 2000,
-            text=f"🎉 BREAKEVEN ACHIEVED!<br>Profit: ₹{profit:,}",
+            text=f"🎉 BREAKEVEN ACHIEVED!<br>Profit: {fmt(profit)}",
             showarrow=True,
             arrowhead=2,
             arrowcolor="green",
@@ -195,7 +250,7 @@ def create_breakeven_chart():
         fig.add_annotation(
             x=0,
             y=total_contribution + 2000,
-            text=f"📈 Need ₹{shortfall:,} more<br>to reach breakeven",
+            text=f"📈 Need {fmt(shortfall)} more<br>to reach breakeven",
             showarrow=True,
             arrowhead=2,
             arrowcolor="orange",
@@ -203,72 +258,91 @@ def create_breakeven_chart():
             bordercolor="orange"
         )
     
-    return fig
+    return fig.to_json()
+
+def create_breakeven_chart():
+    """Create simple breakeven bar chart"""
+    qtys = sales_quantities(st.session_state.sales)
+    if not any(qtys):
+        return _empty_fig(fixed_costs)
+    prices = tuple(st.session_state.prices[item] for item in ORDER)
+    return pio.from_json(_chart_json(qtys, prices, VARIABLE_COSTS, fixed_costs))
 
 def reset_all():
-    st.session_state.state = {"Latte": 0, "Americano": 0, "Cappuccino": 0}
+    st.session_state.sales = Sales()
 
-# UI Layout
-st.markdown('<h1 class="main-header">☕ My Café 📊</h1>', unsafe_allow_html=True)
+def _analytics_panel():
+    """Render the stats and chart from the current session state"""
+    st.subheader("📊 REAL-TIME ANALYTICS")
 
-with st.container():
+    prices = st.session_state.prices
+    qty = np.array(sales_quantities(st.session_state.sales), dtype=np.int64)
+    unit_prices = np.fromiter((prices[i] for i in ORDER), dtype=np.int64, count=len(ORDER))
+    total_units = int(qty.sum())
+    revenue = int(qty @ unit_prices)
+    parts = []
+    for name, q, p in zip(ORDER, qty.tolist(), unit_prices.tolist()):
+        parts.append(f"☕ {name}: {q} × {fmt(p)} = {fmt(q * p)}")
+    variable_cost = int(qty @ VCOSTS)
+    contribution = revenue - variable_cost
+    profit = contribution - fixed_costs
+
+    col_stats1, col_stats2 = st.columns(2)
+    with col_stats1:
+        st.markdown('<div class="metric-box">📦 Units Sold: <br><br>' + "<br>".join(parts) + '</div>',
+                    unsafe_allow_html=True)
+        st.metric("💰 Total Revenue", fmt(revenue))
+        st.metric("📦 Variable Cost", fmt(variable_cost))
+    with col_stats2:
+        st.metric("📈 Contribution Margin", fmt(contribution))
+        st.metric("🏢 Fixed Costs", fmt(fixed_costs))
+        st.metric("💵 Net Profit", fmt(profit))
+
+    if profit >= 0:
+        st.markdown(f'<div class="profit-positive">🎉 BREAKEVEN ACHIEVED! Profit: {fmt(profit)}</div>', unsafe_allow_html=True)
+    else:
+        needed = abs(profit)
+        st.markdown(f'<div class="profit-negative">📈 Need {fmt(needed)} more to breakeven</div>', unsafe_allow_html=True)
+
+    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+    st.plotly_chart(create_breakeven_chart(), use_container_width=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@st.fragment
+def _dashboard():
+    """Control panel and analytics; widget callbacks rerun only this fragment"""
     col1, col2 = st.columns([1, 2])
 
     with col1:
         st.subheader("🎛️ CONTROL PANEL")
         for item in items:
             with st.expander(f"☕ {item}", expanded=True):
-                price = st.slider(f"Set {item} Price (₹)", 50, 300, step=5,
-                                  value=items[item]["price"], key=f"{item}_price")
-                items[item]["price"] = price
+                st.slider(f"Set {item} Price (₹)", 50, 300, step=5,
+                          value=st.session_state.prices[item], key=f"{item}_price",
+                          on_change=update_price, args=(item,))
                 
                 # Show variable cost info
-                st.info(f"📊 Variable Cost: ₹{items[item]['variable_cost']}")
+                st.info(f"📊 Variable Cost: {fmt(items[item]['variable_cost'])}")
                 
                 # Quantity slider
                 st.slider(
                     f"Set {item} Quantity",
                     min_value=0,
                     max_value=100,
-                    value=st.session_state.state[item],
+                    value=getattr(st.session_state.sales, item.lower()),
                     step=1,
                     key=f"quantity_{item}",
                     on_change=update_sales,
                     args=(item,)
                 )
 
-        if st.button("🔄 RESET ALL", use_container_width=True):
-            reset_all()
-            st.rerun()
+        st.button("🔄 RESET ALL", use_container_width=True, on_click=reset_all)
 
     with col2:
-        st.subheader("📊 REAL-TIME ANALYTICS")
-
-        state = st.session_state.state
-        total_units = sum(state.values())
-        revenue = sum(state[item] * items[item]["price"] for item in state)
-        variable_cost = sum(state[item] * items[item]["variable_cost"] for item in state)
-        contribution = revenue - variable_cost
-        profit = contribution - fixed_costs
+        _analytics_panel()
 
-        col_stats1, col_stats2 = st.columns(2)
-        with col_stats1:
-            st.markdown(f'<div class="metric-box">📦 Units Sold: <br>'
-                        f'{"".join([f"<br>☕ {item}: {count} × ₹{items[item]['price']} = ₹{count * items[item]['price']}" for item, count in state.items()])}</div>',
-                        unsafe_allow_html=True)
-            st.markdown(f'<div class="metric-box">💰 Total Revenue: ₹{revenue:,}</div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="metric-box">📦 Variable Cost: ₹{variable_cost:,}</div>', unsafe_allow_html=True)
-        with col_stats2:
-            st.markdown(f'<div class="metric-box">📈 Contribution Margin: ₹{contribution:,}</div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="metric-box">🏢 Fixed Costs: ₹{fixed_costs:,}</div>', unsafe_allow_html=True)
-            st.markdown(f'<div class="metric-box">💵 Net Profit: ₹{profit:,}</div>', unsafe_allow_html=True)
-
-        if profit >= 0:
-            st.markdown(f'<div class="profit-positive">🎉 BREAKEVEN ACHIEVED! Profit: ₹{profit:,}</div>', unsafe_allow_html=True)
-        else:
-            needed = abs(profit)
-            st.markdown(f'<div class="profit-negative">📈 Need ₹{needed:,} more to breakeven</div>', unsafe_allow_html=True)
+# UI Layout
+st.markdown('<h1 class="main-header">☕ My Café 📊</h1>', unsafe_allow_html=True)
 
-        st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-        st.plotly_chart(create_breakeven_chart(), use_container_width=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+with st.container():
+    _dashboard()